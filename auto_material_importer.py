@@ -1,7 +1,34 @@
+import bisect
+import functools
+import json
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 import maya.cmds as cmds
+import maya.api.OpenMaya as om
 
-EXTENSIONS = ['.png', '.jpg', '.jpeg', '.tga', '.tif', '.tiff', '.exr']
+EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tga', '.tif', '.tiff', '.exr')
+EXT_SET = frozenset(EXTENSIONS)
+
+# Threads used to list texture folders concurrently
+SCAN_WORKERS = 8
+
+# Folders never searched for textures, on top of hidden ones like .git or .mayaSwatches
+SKIP_DIRS = frozenset(('__MACOSX', 'node_modules'))
+
+# Sidecar written next to an imported FBX so unchanged texture folders are not rescanned
+INDEX_CACHE_SUFFIX = '.texmap.json'
+INDEX_CACHE_VERSION = 1
+
+# place2dTexture -> file plug suffixes a texture needs to sample its UVs
+PLACE2D_UV_CONNECTIONS = (('.outUV', '.uvCoord'), ('.outUvFilterSize', '.uvFilterSize'))
+
+# Full place2dTexture -> file wiring, so placement edits drive the texture
+PLACE2D_CONNECTIONS = tuple(('.' + attr, '.' + attr) for attr in (
+    'coverage', 'translateFrame', 'rotateFrame', 'mirrorU', 'mirrorV',
+    'stagger', 'wrapU', 'wrapV', 'repeatUV', 'offset', 'rotateUV',
+    'noiseUV', 'vertexUvOne', 'vertexUvTwo', 'vertexUvThree', 'vertexCameraOne'
+)) + PLACE2D_UV_CONNECTIONS
 
 # Mapping of texture suffixes to aiStandardSurface destinations
 TEXTURE_RULES = {
@@ -49,6 +76,28 @@ TEXTURE_RULES = {
     },
 }
 
+
+def _suffix_keys(rules):
+    """Flatten ``rules`` into ``(lowercase suffix, rule key)`` pairs."""
+    return tuple((suf.lower(), key) for key, data in rules.items() for suf in data['suffixes'])
+
+
+# Every (lowercase suffix, rule key) pair of TEXTURE_RULES, in rule order
+SUFFIX_KEYS = _suffix_keys(TEXTURE_RULES)
+
+# Source attributes copied onto the new shader, in priority order:
+# (source attribute, aiStandardSurface attribute, value kind)
+COPY_RULES = (
+    ('color', 'baseColor', 'double3'),
+    ('transparency', 'opacity', 'invert3'),
+    ('specularColor', 'specularColor', 'double3'),
+    ('roughness', 'specularRoughness', 'scalar'),
+    ('specularRoughness', 'specularRoughness', 'scalar'),
+    ('metalness', 'metalness', 'scalar'),
+    ('emissionColor', 'emissionColor', 'double3'),
+    ('emission', 'emission', 'scalar'),
+)
+
 def ensure_plugins():
     """Load required plugins if not already loaded."""
     for plug in ('mtoa', 'fbxmaya'):
@@ -71,130 +120,323 @@ def pick_texture_dir(fbx_path):
     return res[0] if res else os.path.dirname(fbx_path)
 
 
-def find_texture(material, directory, suffixes):
-    """Search ``directory`` for a texture starting with ``material`` and any suffix."""
+def _scan_directory(directory):
+    """List ``directory`` once, returning its texture files, subdirectories and mtime.
+
+    The mtime is ``None`` when the folder could not be read.
+    """
+    files = []
+    subdirs = []
+    mtime = None
+    try:
+        # Taken before listing, so a change made during the scan invalidates the cache
+        mtime = os.stat(directory).st_mtime_ns
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith('.') and entry.name not in SKIP_DIRS:
+                        subdirs.append(entry.path)
+                elif entry.is_file():
+                    name, _, ext = entry.name.rpartition('.')
+                    # A bare '.png' has no stem for a material name to match
+                    if not name or '.' + ext.lower() not in EXT_SET:
+                        continue
+                    files.append((name.lower(), entry.path))
+    except OSError:
+        mtime = None
+    return files, subdirs, mtime
+
+
+def _cache_filters():
+    """Return the scan settings a cached file list depends on, in JSON form."""
+    return [list(EXTENSIONS), sorted(SKIP_DIRS)]
+
+
+def _load_index_cache(cache_path, directory):
+    """Return the file list cached in ``cache_path``, or ``None`` when it is stale.
+
+    The cache holds as long as no scanned folder changed its mtime, which
+    happens whenever an entry inside it is added, removed or renamed.
+    """
+    try:
+        with open(cache_path) as fh:
+            data = json.load(fh)
+        if (data['version'] != INDEX_CACHE_VERSION or data['root'] != directory
+                or data['filters'] != _cache_filters()):
+            return None
+        for path, mtime in data['dirs'].items():
+            if os.stat(path).st_mtime_ns != mtime:
+                return None
+        return [tuple(entry) for entry in data['files']]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _save_index_cache(cache_path, directory, files, mtimes):
+    """Write ``files`` to ``cache_path``; an unwritable location just skips caching."""
+    if None in mtimes.values():
+        return
+    data = {
+        'version': INDEX_CACHE_VERSION,
+        'root': directory,
+        'filters': _cache_filters(),
+        'dirs': mtimes,
+        'files': files,
+    }
+    try:
+        with open(cache_path, 'w') as fh:
+            json.dump(data, fh)
+        # Creating the sidecar inside a scanned folder bumps that folder's mtime;
+        # record the new one, since rewriting an existing file leaves it alone
+        folder = os.path.dirname(cache_path)
+        if folder in mtimes:
+            mtime = os.stat(folder).st_mtime_ns
+            if mtime != mtimes[folder]:
+                mtimes[folder] = mtime
+                with open(cache_path, 'w') as fh:
+                    json.dump(data, fh)
+    except OSError:
+        pass
+
+
+def build_texture_index(directory, cache_path=None):
+    """Scan ``directory`` once and return an index of the texture files under it.
+
+    ``cache_path`` names a JSON sidecar reused while no scanned folder has changed.
+    """
+    files = _load_index_cache(cache_path, directory) if cache_path else None
+    if files is None:
+        files = []
+        mtimes = {}
+        pending = [directory]
+        # List one folder level at a time so slow readdir calls overlap
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+            while pending:
+                subdirs = []
+                for path, (found, children, mtime) in zip(pending, pool.map(_scan_directory, pending)):
+                    files.extend(found)
+                    subdirs.extend(children)
+                    mtimes[path] = mtime
+                pending = subdirs
+        if cache_path:
+            _save_index_cache(cache_path, directory, files, mtimes)
+    stems = sorted((stem, pos) for pos, (stem, _) in enumerate(files))
+    pattern = _suffix_matcher(SUFFIX_KEYS)[0]
+    present = {match.group() for stem, _ in files for match in pattern.finditer(stem)}
+    suffix_keys = tuple(pair for pair in SUFFIX_KEYS if pair[0] in present)
+    # files: (lowercase stem, path) in scan order; stems: (stem, position) sorted
+    # for bisecting by material prefix; lookups: memoized searches, misses included;
+    # suffix_keys: the SUFFIX_KEYS entries some file actually contains
+    return {'files': files, 'stems': stems, 'lookups': {}, 'suffix_keys': suffix_keys}
+
+
+def _prefix_matches(index, prefix):
+    """Return indexed ``(stem, path)`` entries whose stem starts with ``prefix``."""
+    stems = index['stems']
+    hits = []
+    pos = bisect.bisect_left(stems, (prefix,))
+    while pos < len(stems) and stems[pos][0].startswith(prefix):
+        hits.append(stems[pos][1])
+        pos += 1
+    files = index['files']
+    return [files[i] for i in sorted(hits)]
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_match(suffixes):
+    """Return a regex finding any of ``suffixes`` inside a lowercase stem, longest first.
+
+    Custom ``_rough`` and ``_roughness`` suffixes then match ``wood_roughness`` as
+    ``_roughness``; no default suffixes overlap that way.
+    """
+    ordered = sorted({suf.lower() for suf in suffixes}, key=len, reverse=True)
+    return re.compile('|'.join(re.escape(suf) for suf in ordered))
+
+
+@functools.lru_cache(maxsize=None)
+def _suffix_matcher(suffix_keys):
+    """Return one regex for every suffix in ``suffix_keys`` plus a suffix -> key dict."""
+    key_of = {}
+    for suf, key in suffix_keys:
+        key_of.setdefault(suf, key)
+    return _compile_match(tuple(key_of)), key_of
+
+
+def find_all_textures(material, index, rules=None):
+    """Resolve every category in ``rules`` for ``material`` in a single pass.
+
+    Returns a dict mapping rule keys to the first indexed texture starting
+    with ``material`` and containing one of that rule's suffixes. ``rules``
+    defaults to ``TEXTURE_RULES``.
+    """
+    suffix_keys = index['suffix_keys'] if rules is None else _suffix_keys(rules)
+    if not suffix_keys:
+        return {}
     mat = material.lower()
-    for root, _, files in os.walk(directory):
-        for fname in files:
-            name, ext = os.path.splitext(fname)
-            if ext.lower() not in EXTENSIONS:
-                continue
-            lname = name.lower()
-            if not lname.startswith(mat):
-                continue
-            for suf in suffixes:
-                if suf.lower() in lname:
-                    return os.path.join(root, fname)
-    return None
+    lookups = index['lookups']
+    found = lookups.get((mat, suffix_keys))
+    if found is None:
+        found = {}
+        pattern, key_of = _suffix_matcher(suffix_keys)
+        wanted = len(set(key_of.values()))
+        for lname, path in _prefix_matches(index, mat):
+            for match in pattern.finditer(lname):
+                found.setdefault(key_of[match.group()], path)
+            if len(found) == wanted:
+                break
+        lookups[mat, suffix_keys] = found
+    return dict(found)
+
+
+def _dependency_node(node):
+    """Return an ``MFnDependencyNode`` attached to the node called ``node``."""
+    sel = om.MSelectionList()
+    sel.add(node)
+    return om.MFnDependencyNode(sel.getDependNode(0))
 
 
-def _create_file_node(shader, attribute, texture_path, color_space):
+def _wire_place2d(file_node, place, full_place2d=False):
+    """Connect ``place`` to ``file_node``, through ``cmds`` so the edit can be undone."""
+    pairs = PLACE2D_CONNECTIONS if full_place2d else PLACE2D_UV_CONNECTIONS
+    for src, dst in pairs:
+        cmds.connectAttr(place + src, file_node + dst, force=True)
+
+
+def _create_file_node(shader, attribute, texture_path, color_space, full_place2d=False, place=None,
+                      file_nodes=None):
+    if file_nodes is not None and texture_path in file_nodes:
+        return file_nodes[texture_path]
     file_node = cmds.shadingNode('file', asTexture=True, name='%s_%s_file' % (shader, attribute))
-    place = cmds.shadingNode('place2dTexture', asUtility=True, name=file_node + '_place2d')
-    for attr in (
-        'coverage', 'translateFrame', 'rotateFrame', 'mirrorU', 'mirrorV',
-        'stagger', 'wrapU', 'wrapV', 'repeatUV', 'offset', 'rotateUV',
-        'noiseUV', 'vertexUvOne', 'vertexUvTwo', 'vertexUvThree', 'vertexCameraOne'
-    ):
-        cmds.connectAttr(place + '.' + attr, file_node + '.' + attr, force=True)
-    cmds.connectAttr(place + '.outUV', file_node + '.uvCoord', force=True)
-    cmds.connectAttr(place + '.outUvFilterSize', file_node + '.uvFilterSize', force=True)
+    if place is None:
+        place = cmds.shadingNode('place2dTexture', asUtility=True, name=file_node + '_place2d')
+    _wire_place2d(file_node, place, full_place2d)
     cmds.setAttr(file_node + '.fileTextureName', texture_path, type='string')
     try:
         cmds.setAttr(file_node + '.colorSpace', color_space, type='string')
     except Exception:
         pass
+    if file_nodes is not None:
+        file_nodes[texture_path] = file_node
     return file_node
 
 
-def connect_file(shader, attribute, texture_path, color_space='sRGB', channel='outColor'):
-    """Connect a texture file to ``shader.attribute``."""
-    file_node = _create_file_node(shader, attribute, texture_path, color_space)
+def connect_file(shader, attribute, texture_path, color_space='sRGB', channel='outColor', full_place2d=False,
+                 place=None, file_nodes=None):
+    """Connect a texture file to ``shader.attribute``.
+
+    Only the UV plugs of its ``place2dTexture`` are wired unless
+    ``full_place2d`` is set. Pass ``place`` to share an existing
+    ``place2dTexture`` instead of creating one for this file. ``file_nodes``
+    maps texture paths to file nodes that are reused instead of creating new
+    ones; nodes created here are added to it.
+    """
+    file_node = _create_file_node(shader, attribute, texture_path, color_space, full_place2d, place, file_nodes)
     cmds.connectAttr(file_node + '.' + channel, shader + '.' + attribute, force=True)
     return file_node
 
 
-def connect_normal_map(shader, texture_path):
-    file_node = _create_file_node(shader, 'normal', texture_path, 'Raw')
+def connect_normal_map(shader, texture_path, full_place2d=False, place=None, file_nodes=None):
+    file_node = _create_file_node(shader, 'normal', texture_path, 'Raw', full_place2d, place, file_nodes)
     ai_normal = cmds.shadingNode('aiNormalMap', asUtility=True, name='%s_aiNormalMap' % shader)
     cmds.connectAttr(file_node + '.outColor', ai_normal + '.input', force=True)
     cmds.connectAttr(ai_normal + '.outValue', shader + '.normalCamera', force=True)
 
 
-def connect_height_map(shader, sg, texture_path):
-    file_node = _create_file_node(shader, 'height', texture_path, 'Raw')
+def connect_height_map(shader, sg, texture_path, full_place2d=False, place=None, file_nodes=None):
+    file_node = _create_file_node(shader, 'height', texture_path, 'Raw', full_place2d, place, file_nodes)
     disp = cmds.shadingNode('displacementShader', asShader=True, name='%s_displacement' % shader)
     cmds.connectAttr(file_node + '.outAlpha', disp + '.displacement', force=True)
     cmds.connectAttr(disp + '.displacement', sg + '.displacementShader', force=True)
+    return disp
 
 
-def copy_basic_attrs(original, shader):
-    """Copy simple attributes from ``original`` to ``shader``."""
-    try:
-        if cmds.objExists(original + '.color'):
-            col = cmds.getAttr(original + '.color')[0]
-            cmds.setAttr(shader + '.baseColor', *col, type='double3')
+def _connect_rule_file(shader, sgs, texture_path, data, place=None, file_nodes=None):
+    """Connect a ``TEXTURE_RULES`` entry straight to its shader slot."""
+    connect_file(shader, data['attr'], texture_path, data['colorSpace'], data['channel'], place=place,
+                 file_nodes=file_nodes)
 
-    except Exception as e:
-        cmds.warning('Failed to copy color: %s' % e)
 
-    try:
-        if cmds.objExists(original + '.transparency'):
-            tr = cmds.getAttr(original + '.transparency')[0]
-            inv = [1 - v for v in tr]
-            cmds.setAttr(shader + '.opacity', *inv, type='double3')
+def _connect_rule_emission(shader, sgs, texture_path, data, place=None, file_nodes=None):
+    _connect_rule_file(shader, sgs, texture_path, data, place, file_nodes)
+    cmds.setAttr(shader + '.emission', 1)
 
-    except Exception as e:
-        cmds.warning('Failed to copy transparency: %s' % e)
 
-    try:
-        if cmds.objExists(original + '.specularColor'):
-            spec = cmds.getAttr(original + '.specularColor')[0]
-            cmds.setAttr(shader + '.specularColor', *spec, type='double3')
+def _connect_rule_normal(shader, sgs, texture_path, data, place=None, file_nodes=None):
+    connect_normal_map(shader, texture_path, place=place, file_nodes=file_nodes)
 
-    except Exception as e:
-        cmds.warning('Failed to copy specularColor: %s' % e)
 
-    for attr in ('roughness', 'specularRoughness'):
-        if cmds.objExists(original + '.' + attr):
-            try:
-                val = cmds.getAttr(original + '.' + attr)
-                if isinstance(val, list):
-                    val = val[0]
-                cmds.setAttr(shader + '.specularRoughness', val)
-                break
+def _connect_rule_height(shader, sgs, texture_path, data, place=None, file_nodes=None):
+    """Displace every shading group in ``sgs`` through one displacementShader."""
+    disp = connect_height_map(shader, sgs[0], texture_path, place=place, file_nodes=file_nodes)
+    for sg in sgs[1:]:
+        cmds.connectAttr(disp + '.displacement', sg + '.displacementShader', force=True)
 
-            except Exception as e:
-                cmds.warning('Failed to copy %s: %s' % (attr, e))
+
+# TEXTURE_RULES keys needing more than a plain file connection; others use _connect_rule_file
+RULE_CONNECTORS = {
+    'emission': _connect_rule_emission,
+    'normal': _connect_rule_normal,
+    'height': _connect_rule_height,
+}
+
+
+def _plug_value(plug):
+    """Read a numeric plug directly, as a tuple when the plug is compound."""
+    if plug.isCompound:
+        return tuple(plug.child(i).asDouble() for i in range(plug.numChildren()))
+    return plug.asDouble()
+
+
+def _node_type(node, cache):
+    """Return ``cmds.nodeType(node)``, remembering the answer in ``cache``."""
+    ntype = cache.get(node)
+    if ntype is None:
+        ntype = cache[node] = cmds.nodeType(node)
+    return ntype
+
+
+def _try_copy(node_fn, src_attr, shader, dst_attr, kind):
+    """Copy one ``COPY_RULES`` entry onto ``shader``, warning on failure."""
     try:
-        if cmds.objExists(original + '.metalness'):
-            val = cmds.getAttr(original + '.metalness')
-            if isinstance(val, list):
+        val = _plug_value(node_fn.findPlug(src_attr, False))
+        if kind == 'scalar':
+            if isinstance(val, tuple):
                 val = val[0]
-            cmds.setAttr(shader + '.metalness', val)
-    except Exception as e:
-        cmds.warning('Failed to copy metalness: %s' % e)
-    try:
-        if cmds.objExists(original + '.emissionColor'):
-            col = cmds.getAttr(original + '.emissionColor')[0]
-            cmds.setAttr(shader + '.emissionColor', *col, type='double3')
+            cmds.setAttr(shader + '.' + dst_attr, val)
+        else:
+            if kind == 'invert3':
+                val = [1 - v for v in val]
+            cmds.setAttr(shader + '.' + dst_attr, *val, type='double3')
+        if dst_attr == 'emissionColor':
             cmds.setAttr(shader + '.emission', 1)
     except Exception as e:
-        cmds.warning('Failed to copy emissionColor: %s' % e)
-    try:
+        cmds.warning('Failed to copy %s: %s' % (src_attr, e))
+        return False
+    return True
 
-        if cmds.objExists(original + '.emission'):
-            val = cmds.getAttr(original + '.emission')
-            if isinstance(val, list):
-                val = val[0]
-            cmds.setAttr(shader + '.emission', val)
 
-    except Exception as e:
-        cmds.warning('Failed to copy emission: %s' % e)
+def copy_basic_attrs(original, shader, node_fn=None):
+    """Copy simple attributes from ``original`` to ``shader``.
+
+    ``node_fn`` may be an ``MFnDependencyNode`` already attached to ``original``.
+    """
+    if node_fn is None:
+        node_fn = _dependency_node(original)
+    copied = set()
+    for src_attr, dst_attr, kind in COPY_RULES:
+        if dst_attr in copied or not node_fn.hasAttribute(src_attr):
+            continue
+        if _try_copy(node_fn, src_attr, shader, dst_attr, kind):
+            copied.add(dst_attr)
+
 
+def reconnect_existing_textures(original, shader, node_types=None):
+    """Reconnect file textures from ``original`` to ``shader``.
 
-def reconnect_existing_textures(original, shader):
-    """Reconnect file textures from ``original`` to ``shader``."""
+    Returns the set of ``shader`` attributes that received a connection.
+    """
+    if node_types is None:
+        node_types = {}
     mapping = {
         'color': ('baseColor', 'outColor'),
         'specularColor': ('specularColor', 'outColor'),
@@ -207,140 +449,201 @@ def reconnect_existing_textures(original, shader):
         'emissionColor': ('emissionColor', 'outColor'),
     }
 
-    found = False
+    # One query for every incoming connection, grouped by destination attribute
+    incoming = {}
+    conns = cmds.listConnections(original, source=True, destination=False, connections=True, plugs=True) or []
+    for dst_plug, src_plug in zip(conns[::2], conns[1::2]):
+        incoming.setdefault(dst_plug.partition('.')[2], []).append((src_plug, dst_plug))
+
+    connected = set()
     for src_attr, (dst_attr, chan) in mapping.items():
-        plugs = cmds.listConnections('%s.%s' % (original, src_attr), source=True, destination=False, plugs=True) or []
-        for plug in plugs:
-            node = plug.split('.')[0]
-            if cmds.nodeType(node) != 'file':
+        links = incoming.get(src_attr)
+        if not links:
+            continue
+        target = '%s.%s' % (shader, dst_attr)
+        for plug, orig_plug in links:
+            node = plug.partition('.')[0]
+            if _node_type(node, node_types) != 'file':
                 continue
 
-            target = '%s.%s' % (shader, dst_attr)
-            source = '%s.%s' % (node, chan)
-
-            if chan == 'outAlpha' and not cmds.attributeQuery('outAlpha', node=node, exists=True):
-                if cmds.attributeQuery('outColorR', node=node, exists=True):
-                    source = '%s.outColorR' % node
-                else:
-                    source = '%s.outColor' % node
-
+            # Only file nodes get here, and they always have outAlpha and alphaIsLuminance
             if dst_attr in ('specularRoughness', 'metalness', 'opacity'):
                 try:
                     cmds.setAttr(node + '.colorSpace', 'Raw', type='string')
-                    if cmds.attributeQuery('alphaIsLuminance', node=node, exists=True):
-                        cmds.setAttr(node + '.alphaIsLuminance', 1)
                 except Exception:
                     pass
+                cmds.setAttr(node + '.alphaIsLuminance', 1)
 
-            cmds.connectAttr(source, target, force=True)
-
-            try:
-                cmds.disconnectAttr('%s.%s' % (node, chan), plug)
-            except Exception:
-                pass
+            cmds.connectAttr('%s.%s' % (node, chan), target, force=True)
+            # The snapshot guarantees this connection exists
+            cmds.disconnectAttr(plug, orig_plug)
             if dst_attr == 'emissionColor':
-                try:
-                    cmds.setAttr(shader + '.emission', 1)
-                except Exception:
-                    pass
-            found = True
+                cmds.setAttr(shader + '.emission', 1)
+            connected.add(dst_attr)
 
-    norm_conns = cmds.listConnections(original + '.normalCamera', source=True, destination=False, plugs=True) or []
-    for plug in norm_conns:
-        node = plug.split('.')[0]
+    for plug, orig_plug in incoming.get('normalCamera', ()):
+        node = plug.partition('.')[0]
         file_node = None
         ai_normal = None
-        if cmds.nodeType(node) == 'aiNormalMap':
+        node_type = _node_type(node, node_types)
+        if node_type == 'aiNormalMap':
             ai_normal = node
             links = cmds.listConnections(ai_normal + '.input', source=True, destination=False, plugs=True) or []
-            if links and cmds.nodeType(links[0].split('.')[0]) == 'file':
-                file_node = links[0].split('.')[0]
-        elif cmds.nodeType(node) == 'file':
+            link_node = links[0].partition('.')[0] if links else None
+            if link_node and _node_type(link_node, node_types) == 'file':
+                file_node = link_node
+        elif node_type == 'file':
             file_node = node
         if file_node:
             if not ai_normal:
                 ai_normal = cmds.shadingNode('aiNormalMap', asUtility=True, name='%s_aiNormalMap' % shader)
                 cmds.connectAttr(file_node + '.outColor', ai_normal + '.input', force=True)
             cmds.connectAttr(ai_normal + '.outValue', shader + '.normalCamera', force=True)
-            try:
-                cmds.disconnectAttr(ai_normal + '.outValue', plug)
-            except Exception:
-                try:
-                    cmds.disconnectAttr(file_node + '.outColor', plug)
-                except Exception:
-                    pass
-            found = True
-    return found
+            cmds.disconnectAttr(plug, orig_plug)
+            connected.add('normalCamera')
+    return connected
+
 
+def apply_default_values(shader, connected=None):
+    """Ensure the shader has sane defaults when no textures are connected.
 
-def apply_default_values(shader):
-    """Ensure the shader has sane defaults when no textures are connected."""
-    if not cmds.listConnections(shader + '.baseColor', source=True):
+    ``connected`` names the shader attributes already driven by a texture; it
+    is queried from the scene when omitted.
+    """
+    if connected is None:
+        connected = _driven_attributes(shader)
+    if 'baseColor' not in connected:
         cmds.setAttr(shader + '.baseColor', 0.5, 0.5, 0.5, type='double3')
-    if not cmds.listConnections(shader + '.specularRoughness', source=True):
+    if 'specularRoughness' not in connected:
         cmds.setAttr(shader + '.specularRoughness', 0.5)
-    if not cmds.listConnections(shader + '.metalness', source=True):
+    if 'metalness' not in connected:
         cmds.setAttr(shader + '.metalness', 0.0)
-    if not cmds.listConnections(shader + '.opacity', source=True):
+    if 'opacity' not in connected:
         cmds.setAttr(shader + '.opacity', 1.0, 1.0, 1.0, type='double3')
 
 
-def setup_material(sg, texture_dir):
-    shaders = cmds.ls(cmds.listConnections(sg + '.surfaceShader'), materials=True) or []
-    if not shaders:
-        return
-    original = shaders[0]
+def surface_materials(sgs):
+    """Map each shading group in ``sgs`` to ``(material, node type)`` in two queries."""
+    if not sgs:
+        return {}
+    conns = cmds.listConnections(
+        [sg + '.surfaceShader' for sg in sgs],
+        source=True, destination=False, connections=True
+    ) or []
+    shaders = {}
+    for plug, node in zip(conns[::2], conns[1::2]):
+        shaders.setdefault(plug.partition('.')[0], node)
+    listed = cmds.ls(list(shaders.values()), materials=True, showType=True) or []
+    types = dict(zip(listed[::2], listed[1::2]))
+    return {sg: (mat, types[mat]) for sg, mat in shaders.items() if mat in types}
 
-    shapes = cmds.listConnections(sg, type='mesh') or []
+
+def _driven_attributes(node):
+    """Return the names of attributes on ``node`` that have an incoming connection."""
+    conns = cmds.listConnections(node, source=True, destination=False, connections=True, plugs=True) or []
+    return {plug.partition('.')[2] for plug in conns[::2]}
+
+
+def _needs_retexture(connected):
+    """Return True when a ``TEXTURE_RULES`` shader slot is missing from ``connected``."""
+    return any(
+        data['attr'] not in connected
+        for key, data in TEXTURE_RULES.items() if key != 'height'
+    )
+
+
+def _current_uv_sets(shapes):
+    """Return ``{shape: current UV set}`` for ``shapes``, querying each shape once."""
     uv_state = {}
     for shp in shapes:
+        if shp in uv_state:
+            continue
         try:
             current = cmds.polyUVSet(shp, query=True, currentUVSet=True)
             uv_state[shp] = current[0] if current else None
         except Exception:
             uv_state[shp] = None
+    return uv_state
+
+
+def _restore_uv_sets(uv_state):
+    """Make the UV sets recorded by ``_current_uv_sets`` current again."""
+    for shp, uv in uv_state.items():
+        if uv:
+            try:
+                cmds.polyUVSet(shp, currentUVSet=True, uvSet=uv)
+            except Exception:
+                pass
 
 
-    src = cmds.rename(original, original + '_src')
-    shader = cmds.shadingNode('aiStandardSurface', asShader=True, name=original)
-    copy_basic_attrs(src, shader)
-    reused = reconnect_existing_textures(src, shader)
+def setup_material(sg, index, original=None, node_types=None, file_nodes=None, preserve_uvs=True,
+                   shared_sgs=(), original_type=None):
+    """Convert the material of ``sg`` and ``shared_sgs`` to an ``aiStandardSurface``.
+
+    ``node_types`` and ``file_nodes`` are caches that may be shared across calls.
+    """
+    if file_nodes is None:
+        file_nodes = {}
+    sgs = [sg]
+    sgs.extend(shared_sgs)
+    if original is None:
+        shaders = cmds.ls(cmds.listConnections(sg + '.surfaceShader'), materials=True) or []
+        if not shaders:
+            return None
+        original = shaders[0]
+    if original_type is None:
+        original_type = cmds.nodeType(original)
+
+    # Already an aiStandardSurface: fill in its empty slots instead of rebuilding it.
+    in_place = original_type == 'aiStandardSurface'
+    if in_place:
+        connected = _driven_attributes(original)
+        if not _needs_retexture(connected):
+            return original
 
-    if not reused:
+    uv_state = {}
+    if preserve_uvs:
+        uv_state = _current_uv_sets(cmds.listConnections(sgs, type='mesh') or [])
+
+
+    if in_place:
+        src = shader = original
+    else:
+        src = cmds.rename(original, original + '_src')
+        shader = cmds.shadingNode('aiStandardSurface', asShader=True, name=original)
+        src_fn = _dependency_node(src)
+        copy_basic_attrs(src, shader, src_fn)
+        connected = reconnect_existing_textures(src, shader, node_types)
+
+    if in_place or not connected:
+        textures = find_all_textures(original, index)
+        # New file nodes for this material share one placement; a file node
+        # reused from an earlier material keeps that material's placement
+        place = None
         for key, data in TEXTURE_RULES.items():
+            tex = textures.get(key)
+            if not tex:
+                continue
             dst_attr = data['attr']
-            if key == 'normal':
-                if cmds.listConnections(shader + '.normalCamera', source=True):
-                    continue
-            elif key == 'height':
-                if cmds.listConnections(sg + '.displacementShader', source=True):
+            targets = sgs
+            if key == 'height':
+                targets = [s for s in sgs if not cmds.listConnections(s + '.displacementShader', source=True)]
+                if not targets:
                     continue
-            else:
-                if cmds.listConnections(shader + '.' + dst_attr, source=True):
-                    continue
-            tex = find_texture(original, texture_dir, data['suffixes'])
-            if not tex:
+            elif dst_attr in connected:
                 continue
-            if key == 'normal':
-                connect_normal_map(shader, tex)
-            elif key == 'height':
-                connect_height_map(shader, sg, tex)
-            else:
-                connect_file(shader, dst_attr, tex, data['colorSpace'], data['channel'])
-                if key == 'emission':
-                    cmds.setAttr(shader + '.emission', 1)
-
+            if place is None and tex not in file_nodes:
+                place = cmds.shadingNode('place2dTexture', asUtility=True, name=shader + '_place2d')
+            RULE_CONNECTORS.get(key, _connect_rule_file)(shader, targets, tex, data, place, file_nodes)
+            connected.add(dst_attr)
 
-    apply_default_values(shader)
-    cmds.connectAttr(shader + '.outColor', sg + '.surfaceShader', force=True)
 
-    for shp, uv in uv_state.items():
-        if uv:
-            try:
-                cmds.polyUVSet(shp, currentUVSet=True, uvSet=uv)
+    apply_default_values(shader, connected)
+    if not in_place:
+        for target in sgs:
+            cmds.connectAttr(shader + '.outColor', target + '.surfaceShader', force=True)
 
-            except Exception:
-                pass
+    _restore_uv_sets(uv_state)
 
     if shader != src:
         if not cmds.listConnections(src, source=False, destination=True):
@@ -348,6 +651,68 @@ def setup_material(sg, texture_dir):
                 cmds.delete(src)
             except Exception:
                 pass
+    return shader
+
+
+def _suspend_evaluation():
+    """Pause Viewport 2.0 and switch the evaluation manager off.
+
+    Returns the previous state for ``_resume_evaluation``.
+    """
+    paused = cmds.about(batch=True) or cmds.ogs(query=True, pause=True)
+    if not paused:
+        cmds.ogs(pause=True)
+    try:
+        mode = cmds.evaluationManager(query=True, mode=True)[0]
+        cmds.evaluationManager(mode='off')
+    except Exception:
+        # Don't leave the viewport paused for the rest of the session
+        if not paused:
+            cmds.ogs(pause=True)
+        raise
+    return paused, mode
+
+
+def _resume_evaluation(state):
+    """Restore the state saved by ``_suspend_evaluation``."""
+    paused, mode = state
+    cmds.evaluationManager(mode=mode)
+    if not paused:
+        # ogs -pause toggles
+        cmds.ogs(pause=True)
+
+
+def _convert_shading_groups(sgs, index):
+    """Run ``setup_material`` on every shading group in ``sgs`` as one undo step."""
+    # Convert each material once, however many shading groups use it
+    materials = surface_materials(sgs)
+    groups = {}
+    for sg in sgs:
+        if sg in materials:
+            groups.setdefault(materials[sg], []).append(sg)
+    # Imported file nodes often feed several materials; look each type up once
+    node_types = {}
+    # Materials that resolve to the same image share its file node
+    file_nodes = {}
+    # Record each mesh's current UV set once, however many groups it belongs to
+    uv_state = {}
+    if sgs:
+        uv_state = _current_uv_sets(cmds.listConnections(sgs, type='mesh') or [])
+    # One undo step for the whole conversion, without redrawing after every edit.
+    # Every scene edit below goes through cmds; raw API modifiers would escape the chunk.
+    cmds.undoInfo(openChunk=True, chunkName='auto_material_importer')
+    cmds.refresh(suspend=True)
+    try:
+        for (original, original_type), group in groups.items():
+            try:
+                setup_material(group[0], index, original, node_types, file_nodes, preserve_uvs=False,
+                               shared_sgs=group[1:], original_type=original_type)
+            except Exception as e:
+                cmds.warning('Failed to set up %s: %s' % (', '.join(group), e))
+        _restore_uv_sets(uv_state)
+    finally:
+        cmds.refresh(suspend=False)
+        cmds.undoInfo(closeChunk=True)
 
 
 def import_fbx_with_materials():
@@ -356,25 +721,31 @@ def import_fbx_with_materials():
     if not fbx:
         return
     tex_dir = pick_texture_dir(fbx)
+    # The folder scan touches no Maya state, so run it while the FBX loads.
+    scanner = ThreadPoolExecutor(max_workers=1)
+    pending_index = scanner.submit(build_texture_index, tex_dir, fbx + INDEX_CACHE_SUFFIX)
+    scanner.shutdown(wait=False)
+    # Only shading groups created by this import get converted
+    existing = set(cmds.ls(type='shadingEngine'))
+    # Keep the viewport and evaluation manager idle while nodes pour in
+    state = _suspend_evaluation()
     try:
-        cmds.file(
-            fbx,
-            i=True,
-            type='FBX',
-            ignoreVersion=True,
-            mergeNamespacesOnClash=False,
-            options='fbx'
-        )
-    except Exception as e:
-        cmds.warning('Could not import FBX: %s' % e)
-        return
-
-    sgs = [s for s in cmds.ls(type='shadingEngine') if s not in ('initialShadingGroup', 'initialParticleSE')]
-    for sg in sgs:
         try:
-            setup_material(sg, tex_dir)
+            cmds.file(
+                fbx,
+                i=True,
+                type='FBX',
+                ignoreVersion=True,
+                mergeNamespacesOnClash=False,
+                options='fbx'
+            )
         except Exception as e:
-            cmds.warning('Failed to set up %s: %s' % (sg, e))
+            cmds.warning('Could not import FBX: %s' % e)
+            return
+        sgs = [s for s in cmds.ls(type='shadingEngine') if s not in existing]
+        _convert_shading_groups(sgs, pending_index.result())
+    finally:
+        _resume_evaluation(state)
 
 
 if __name__ == '__main__':